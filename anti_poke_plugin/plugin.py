@@ -9,39 +9,299 @@ from src.common.database.database_model import PersonInfo
 from src.plugin_system.apis import person_api
 from src.common.logger import get_logger
 from typing import Tuple, Optional, Dict, Any, List, Type
+from collections import namedtuple
+from dataclasses import dataclass
+import functools
+import math
 import random
+import re
 import asyncio
-import toml
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    tomllib = None
+    import toml  # Python 3.10 沿用原来的 toml
 import time
 import os
 
 logger = get_logger("anti_poke")
 
+@dataclass(slots=True)
+class _PokeState:
+    """防戳状态，使用slots减少属性访问与内存开销"""
+    poke_count: int = 0
+    is_silent: bool = False
+    current_silence_duration: int = 0
+    current_poke_threshold: int = 0
+    decay_handle: Optional[asyncio.TimerHandle] = None
+    silence_handle: Optional[asyncio.TimerHandle] = None
+    last_poke_back_time: float = 0.0
+    last_poke_received_time: float = 0.0
+    silence_log_time: float = 0.0
+    silence_log_suppressed: int = 0
+
 # 使用模块级别的全局变量来保存状态
-_POKE_STATE = {
-    'poke_count': 0,
-    'is_silent': False,
-    'silence_start_time': 0,
-    'last_poke_time': 0,
-    'current_silence_duration': 0,
-    'current_poke_threshold': 0,
-    'decay_task': None,
-    'counter_lock': None,
-    'last_poke_back_time': 0,
-    'last_poke_received_time': 0,
-}
+_POKE_STATE = _PokeState()
 
 POKE_BACK_COOLDOWN = 10
+SILENCE_LOG_INTERVAL = 5.0  # 沉默期内“忽略戳一戳”日志的最小间隔（秒）
 
-def _get_or_create_lock():
-    """获取或创建异步锁，处理事件循环未就绪的情况"""
-    if _POKE_STATE['counter_lock'] is None:
-        try:
-            _POKE_STATE['counter_lock'] = asyncio.Lock()
-        except RuntimeError:
-            # 如果没有事件循环，返回None
+# 戳一戳通知消息的固定后缀
+_SUFFIX_DEFAULT = "（这是QQ的一个功能，用于提及某人，但没那么明显）"
+# 触发沉默时附加给回复生成的抗议提示
+_SUFFIX_PROTEST = "（请一定要回答类似于“哼，我不理你了”的话语以表示对过多戳一戳的抗议）"
+
+POKE_DELAY = 3  # 戳一戳前的等待时间（秒），模拟人类反应
+
+# 持有后台任务的强引用，防止任务在完成前被垃圾回收
+_BACKGROUND_TASKS = set()
+
+# 回复发送队列：每个聊天流一个队列和发送任务（stream_id -> (queue, task)），
+# 同一聊天中相邻回复之间保持间隔，队列发送完毕后任务退出
+REPLY_INTERVAL = 1.0
+REPLY_QUEUE_MAX_SIZE = 16
+_REPLY_SENDERS = {}
+
+# person_name -> (user_id, nickname, 缓存时间)，减少重复的数据库查询
+_PERSON_CACHE = {}
+PERSON_CACHE_TTL = 300
+PERSON_CACHE_MAX_SIZE = 256
+
+# 插件私有的随机数生成器，不与其他插件共用全局random实例
+_RNG = random.Random()
+_RAND_SCALE = 1.0 / (1 << 24)  # 把24位随机整数映射到[0, 1)
+
+# 机器人自身的QQ号，运行期间不会变化，首次使用时缓存
+_SELF_QQ = None
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+_CONFIG_PATH = os.path.join(_SCRIPT_DIR, "config.toml")
+
+# 最近一次成功加载的配置及上次检查文件的时间
+_CONFIG_CACHE = {
+    'data': None,
+    'last_check': 0.0,
+}
+CONFIG_CHECK_INTERVAL = 2.0  # 两次检查配置文件修改时间的最小间隔（秒）
+
+# 与config_schema中poke_value的默认值保持一致，值的类型即配置项的类型
+_CONFIG_DEFAULTS = {
+    "min_silence_time": 120,
+    "max_silence_time": 300,
+    "min_silence_counts": 5,
+    "max_silence_counts": 9,
+    "counts_decay_interval": 150,
+    "reflect_probability": 0.4,
+    "follow_probability": 0.3,
+    "joke_probability": 0.4,
+    "insensitivity_duration": 4.0,
+}
+
+# 只读的配置快照，字段名与poke_value中的配置项一致
+_PokeConfig = namedtuple("_PokeConfig", list(_CONFIG_DEFAULTS))
+
+# 概率类配置项，取值限制在[0, 1]
+_PROBABILITY_KEYS = ("reflect_probability", "follow_probability", "joke_probability")
+
+def _normalize_value(key: str, value: Any, default):
+    """把单个配置项转换为默认值的类型并检查取值范围，不合法时回退为默认值"""
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError
+        converted = type(default)(number)
+    except (TypeError, ValueError, OverflowError):
+        logger.warning(f"配置项 poke_value.{key} 的值 {value!r} 不合法，使用默认值 {default}")
+        return default
+
+    if converted != number:
+        logger.warning(f"配置项 poke_value.{key} 应为整数，{value!r} 已截断为 {converted}")
+
+    if key in _PROBABILITY_KEYS:
+        if not 0 <= converted <= 1:
+            clamped = min(max(converted, 0.0), 1.0)
+            logger.warning(f"配置项 poke_value.{key} 的值 {value!r} 超出0到1的范围，已限制为 {clamped}")
+            return clamped
+    elif key == "insensitivity_duration":
+        # 钝感时长为0表示关闭钝感期
+        if converted < 0:
+            logger.warning(f"配置项 poke_value.{key} 不能为负数，使用默认值 {default}")
+            return default
+    elif converted <= 0:
+        # 时长、次数与衰减间隔必须为正，否则定时器会立即触发或阈值失效
+        logger.warning(f"配置项 poke_value.{key} 必须大于0，使用默认值 {default}")
+        return default
+
+    return converted
+
+def _build_config(poke_value: Dict[str, Any]) -> _PokeConfig:
+    """校验并规范化poke_value配置，类型或取值不合法的配置项回退为默认值"""
+    values = {
+        key: _normalize_value(key, poke_value.get(key, default), default)
+        for key, default in _CONFIG_DEFAULTS.items()
+    }
+
+    # randint要求下限不大于上限
+    for low, high in (("min_silence_time", "max_silence_time"), ("min_silence_counts", "max_silence_counts")):
+        if values[low] > values[high]:
+            logger.warning(f"配置项 poke_value.{low} 大于 {high}，已交换两者")
+            values[low], values[high] = values[high], values[low]
+
+    return _PokeConfig(**values)
+
+@functools.lru_cache(maxsize=1)
+def _parse_config(path: str, mtime: float) -> _PokeConfig:
+    """读取并解析TOML配置文件，mtime只作为缓存键，文件修改后缓存自动失效"""
+    if tomllib is not None:
+        with open(path, 'rb') as f:
+            config_data = tomllib.load(f)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            config_data = toml.load(f)
+    poke_value = config_data.get("poke_value", {})
+    return _build_config(poke_value)
+
+def _get_config() -> _PokeConfig:
+    """获取poke_value配置，最多每CONFIG_CHECK_INTERVAL秒检查一次文件是否修改，未修改时直接返回缓存（支持热重载）"""
+    now = time.monotonic()
+    if _CONFIG_CACHE['data'] is not None and now - _CONFIG_CACHE['last_check'] < CONFIG_CHECK_INTERVAL:
+        return _CONFIG_CACHE['data']
+    _CONFIG_CACHE['last_check'] = now
+
+    try:
+        data = _parse_config(_CONFIG_PATH, os.stat(_CONFIG_PATH).st_mtime)
+    except Exception as e:
+        if _CONFIG_CACHE['data'] is None:
+            logger.error(f"加载配置失败: {e}")
+            raise
+        # 热重载时文件可能正在编辑，沿用上一次成功加载的配置
+        logger.warning(f"重新加载配置失败，继续使用上一次的配置: {e}")
+        return _CONFIG_CACHE['data']
+
+    _CONFIG_CACHE['data'] = data
+    return data
+
+async def _delayed_send_poke(component, qq_id, display_message: str, delay: float = POKE_DELAY):
+    """等待一段时间后通过组件发送戳一戳"""
+    try:
+        await asyncio.sleep(delay)
+        await component.send_command("SEND_POKE", {"qq_id": qq_id}, display_message)
+    except Exception as e:
+        logger.error(f"发送戳一戳失败: {e}")
+
+def _get_self_qq() -> Optional[str]:
+    """获取机器人自身QQ号（字符串形式），尚未配置时返回None且不缓存"""
+    global _SELF_QQ
+    if _SELF_QQ is None:
+        qq_account = config_api.get_global_config("bot.qq_account")
+        if qq_account is None:
             return None
-    return _POKE_STATE['counter_lock']
+        _SELF_QQ = str(qq_account)
+    return _SELF_QQ
+
+async def _resolve_person(person_name: str) -> Optional[Tuple[str, str]]:
+    """根据person_name查询(user_id, nickname)，带TTL缓存"""
+    now = time.monotonic()
+    hit = _PERSON_CACHE.get(person_name)
+    if hit and now - hit[2] < PERSON_CACHE_TTL:
+        return hit[0], hit[1]
+
+    personinfo = await database_api.db_get(
+        PersonInfo,
+        filters={"person_name": f"{person_name}"},
+        limit=1
+    )
+    if not personinfo:
+        return None
+
+    # 重新插入以保持按写入时间排序，超出容量时淘汰最早的条目
+    _PERSON_CACHE.pop(person_name, None)
+    if len(_PERSON_CACHE) >= PERSON_CACHE_MAX_SIZE:
+        _PERSON_CACHE.pop(next(iter(_PERSON_CACHE)))
+    _PERSON_CACHE[person_name] = (personinfo['user_id'], personinfo['nickname'], now)
+    return personinfo['user_id'], personinfo['nickname']
+
+async def _reply_sender_worker(stream_id: str, queue: asyncio.Queue):
+    """发送任务：依次发送某个聊天流排队的回复，队列清空后退出"""
+    while True:
+        component, content = queue.get_nowait()
+        try:
+            await component.send_type(message_type="text", content=content, typing=True)
+        except Exception as e:
+            logger.error(f"发送回复失败: {e}")
+
+        if queue.empty():
+            # 最后一条回复后无需等待，直接退出
+            _REPLY_SENDERS.pop(stream_id, None)
+            return
+        await asyncio.sleep(REPLY_INTERVAL)
+
+def _reply_queue_full(stream_id: str) -> bool:
+    """某个聊天流的回复队列是否已满"""
+    sender = _REPLY_SENDERS.get(stream_id)
+    return sender is not None and sender[0].full()
+
+def _enqueue_reply(stream_id: str, component, content: str):
+    """把回复放入对应聊天流的发送队列，该聊天流没有发送任务时启动一个"""
+    sender = _REPLY_SENDERS.get(stream_id)
+    queue = sender[0] if sender is not None else asyncio.Queue(maxsize=REPLY_QUEUE_MAX_SIZE)
+    try:
+        queue.put_nowait((component, content))
+    except asyncio.QueueFull:
+        logger.warning("待发送的回复过多，丢弃本条回复")
+        return
+
+    if sender is None or sender[1].done():
+        task = asyncio.create_task(_reply_sender_worker(stream_id, queue))
+        _REPLY_SENDERS[stream_id] = (queue, task)
+
+def _schedule_decay(loop: asyncio.AbstractEventLoop, delay: float):
+    """（重新）安排下一次计数器衰减，取消尚未触发的旧定时器"""
+    st = _POKE_STATE
+    if st.decay_handle is not None:
+        st.decay_handle.cancel()
+    st.decay_handle = loop.call_later(delay, _on_decay_due)
+
+def _on_decay_due():
+    """衰减定时器回调：计数器减1，仍大于0时按衰减间隔继续安排下一次"""
+    st = _POKE_STATE
+    st.decay_handle = None
+    if st.is_silent or st.poke_count == 0:
+        return
+
+    st.poke_count -= 1
+    logger.info(f"戳一戳计数器衰减，当前计数: {st.poke_count}")
+    if st.poke_count > 0:
+        _schedule_decay(asyncio.get_running_loop(), _get_config().counts_decay_interval)
+
+def _start_silence(loop: asyncio.AbstractEventLoop, duration: int):
+    """进入沉默期，到期后由定时器自动解除"""
+    st = _POKE_STATE
+    st.is_silent = True
+    # 沉默期内不衰减，解除沉默时计数器直接清零
+    if st.decay_handle is not None:
+        st.decay_handle.cancel()
+        st.decay_handle = None
+    st.silence_handle = loop.call_later(duration, _end_silence, duration)
+
+def _end_silence(duration: int):
+    """沉默定时器回调：解除沉默并重置计数器"""
+    st = _POKE_STATE
+    st.silence_handle = None
+    st.is_silent = False
+    st.poke_count = 0  # 重置计数器（仅当解除沉默时）
+    # 清空日志限流状态，避免下一次沉默报告本次遗留的未记录次数
+    st.silence_log_time = 0.0
+    st.silence_log_suppressed = 0
+    logger.info(f"沉默期结束，持续了 {duration} 秒")
+
+def _schedule_poke(component, qq_id, display_message: str):
+    """在后台调度延迟戳一戳，调用方无需等待发送完成"""
+    task = asyncio.create_task(_delayed_send_poke(component, qq_id, display_message))
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
 
 @register_plugin
 class AntiPokePlugin(BasePlugin):
@@ -67,7 +327,7 @@ class AntiPokePlugin(BasePlugin):
     # 配置Schema定义
     config_schema = {
         "plugin": {
-            "config_version": ConfigField(type=str, default="1.3.0", description="插件配置文件版本号"),
+            "config_version": ConfigField(type=str, default="1.3.1", description="插件配置文件版本号"),
             "enabled": ConfigField(type=bool, default=True, description="是否启用插件"),
         },
         "components": {
@@ -82,6 +342,7 @@ class AntiPokePlugin(BasePlugin):
             "counts_decay_interval": ConfigField(type=int, default = 150, description="被戳次数的递减间隔，单位为秒"),
             "reflect_probability": ConfigField(type=float, default = 0.4, description="戳回去的概率，取值0到1之间任意小数。注意，不反戳就会正常回复"),
             "follow_probability": ConfigField(type=float, default = 0.3, description="跟戳的概率，取值0到1之间任意小数。"),
+            "joke_probability": ConfigField(type=float, default = 0.4, description="主动开玩笑戳人的概率，取值0到1之间任意小数。"),
             "insensitivity_duration": ConfigField(type=float, default = 4, description="钝感时长，该设置决定了麦麦的戳一戳钝感时间（无敌帧），整数"),
         },
         "logging": {
@@ -98,6 +359,12 @@ class AntiPokePlugin(BasePlugin):
 
         components = []
 
+        # 启动时预加载配置，尽早暴露配置文件的问题
+        try:
+            _get_config()
+        except Exception:
+            pass  # 错误已由_get_config记录，首次被戳时会再次尝试加载
+
         if self.get_config("components.enable_may_poke", True):
             components.append((AntiPokeAction.get_action_info(), AntiPokeAction))
 
@@ -155,37 +422,28 @@ class AntiPokeAction(BaseAction):
 
         if not self.user_id:
             target_name = self.action_data.get("target_name", "")
-            personinfo = await database_api.db_get(
-            PersonInfo,
-            filters={"person_name": f"{target_name}"},
-            limit=1
-            )
-            if personinfo:
-                self.user_id = personinfo['user_id']
-                self.user_nickname = personinfo['nickname']
+            person = await _resolve_person(target_name)
+            if person:
+                self.user_id, self.user_nickname = person
             if not self.user_id:
                 return False, "无法获取被戳用户的ID"
 
-        current_time = time.time()
+        current_time = time.monotonic()
         case = self.action_data.get("case", "joke") 
 
-        if _POKE_STATE['last_poke_back_time'] > 0:
-                time_since_last_poke_back = current_time - _POKE_STATE['last_poke_back_time']
+        if _POKE_STATE.last_poke_back_time > 0:
+                time_since_last_poke_back = current_time - _POKE_STATE.last_poke_back_time
                 if time_since_last_poke_back < POKE_BACK_COOLDOWN:
                     return True, "戳一戳还在冷却"
 
-        _POKE_STATE['last_poke_time'] = current_time
-
         if case == "request":
-            await asyncio.sleep(3)
-            await self.send_command("SEND_POKE",{"qq_id": self.user_id},f"（戳了{self.user_nickname}一下）")
+            _schedule_poke(self, self.user_id, f"（戳了{self.user_nickname}一下）")
             await self.store_info(case)
             return True, "应对方的要求戳了戳对方"
         
         elif case == "joke":
-            if random.random() < 0.4:
-                await asyncio.sleep(3)
-                await self.send_command("SEND_POKE",{"qq_id": self.user_id},f"（开玩笑地戳了{self.user_nickname}一下）")
+            if _RNG.random() < _get_config().joke_probability:
+                _schedule_poke(self, self.user_id, f"（开玩笑地戳了{self.user_nickname}一下）")
                 await self.store_info(case)
                 return True, "开玩笑地戳了一下"
             else:
@@ -208,7 +466,8 @@ class AntiPokeAction(BaseAction):
 class AntiPokeCommand(BaseCommand):
     command_name = "anti_poke"
     command_description = "防戳插件"
-    command_pattern = r"^(?P<content>[\s\S]+)（这是QQ的一个功能，用于提及某人，但没那么明显）$"
+    # (?s)让.匹配换行，等价于原来的[\s\S]；后缀为固定文本，锚定在结尾
+    command_pattern = r"(?s)^(?P<content>.+)" + re.escape(_SUFFIX_DEFAULT) + r"$"
     command_help = "无使用方法，自动触发"
     command_examples = []
     
@@ -217,125 +476,92 @@ class AntiPokeCommand(BaseCommand):
         self.message = message
         self.log_prefix = f"[Command:{self.command_name}]"
 
-    @property
-    def SILENCE_DURATION_MIN(self):
-        config = self._load_config()
-        return config["poke_value"].get("min_silence_time", 120)
-
-    @property
-    def SILENCE_DURATION_MAX(self):
-        config = self._load_config()
-        return config["poke_value"].get("max_silence_time", 300)
-
-    @property
-    def POKE_COUNT_MIN(self):
-        config = self._load_config()
-        return config["poke_value"].get("min_silence_counts", 5)
-
-    @property
-    def POKE_COUNT_MAX(self):
-        config = self._load_config()
-        return config["poke_value"].get("max_silence_counts", 9)
-
-    @property
-    def DECAY_INTERVAL(self):
-        config = self._load_config()
-        return config["poke_value"].get("counts_decay_interval", 180)
-    
-    @property
-    def REFLECT_POKE_PROBABILITY(self):
-        config = self._load_config()
-        return config["poke_value"].get("reflect_probability", 0.4)
-    
-    @property
-    def FOLLOW_POKE_PROBABILITY(self):
-        config = self._load_config()
-        return config["poke_value"].get("follow_probability", 0.3)
-    
-    @property
-    def INSENSITIVITY_DURATION(self):
-        config = self._load_config()
-        return config["poke_value"].get("insensitivity_duration", 4)
-
     async def execute(self) -> Tuple[bool, Optional[str]]:
+        st = _POKE_STATE
         try:
-            current_time = time.time()
-            if _POKE_STATE['is_silent']: # 沉默截断机制
-                if current_time - _POKE_STATE['silence_start_time'] > _POKE_STATE['current_silence_duration']:
-                    _POKE_STATE['is_silent'] = False
-                    _POKE_STATE['poke_count'] = 0  # 重置计数器（仅当解除沉默时）
-                    logger.info(f"沉默期结束，持续了 {_POKE_STATE['current_silence_duration']} 秒")
-                else:
-                    # 沉默期直接忽略所有通知
-                    logger.info("当前处于沉默期，忽略戳一戳")
-                    return True,"处于沉默期，直接拦截所有戳一戳消息", True
-
-            if not self.message.message_info.message_id == "notice":
+            # 先做开销最小的检查，非戳一戳/沉默期/无关通知尽早返回
+            message_info = self.message.message_info
+            if message_info.message_id != "notice":
                 return True,"非戳一戳消息，无需使用命令", True
 
-            content = self.matched_groups.get("content") 
-            target_id = self.message.message_info.user_info.user_id
-            poked_id = str(self.message.message_info.additional_config.get("target_id"))
-            self_id = config_api.get_global_config("bot.qq_account")
-            target_nickname = await person_api.get_person_value(target_id, "person_name")
+            current_time = time.monotonic()
+            if st.is_silent: # 沉默截断机制，沉默由定时器到期解除
+                # 沉默期直接忽略所有通知，连续被戳时日志按间隔限流
+                if current_time - st.silence_log_time >= SILENCE_LOG_INTERVAL:
+                    if st.silence_log_suppressed:
+                        logger.info(f"当前处于沉默期，忽略戳一戳（期间另有 {st.silence_log_suppressed} 次未记录）")
+                    else:
+                        logger.info("当前处于沉默期，忽略戳一戳")
+                    st.silence_log_time = current_time
+                    st.silence_log_suppressed = 0
+                else:
+                    st.silence_log_suppressed += 1
+                return True,"处于沉默期，直接拦截所有戳一戳消息", True
+
+            cfg = _get_config()
+            target_id = message_info.user_info.user_id
+            poked_id = str(message_info.additional_config.get("target_id"))
+
+            # 一次抽取48位随机数，拆成两个独立的[0, 1)随机值：
+            # rnd供互斥的跟戳/反戳分支共用，reply_rnd用于冷却中的回复判定
+            bits = _RNG.getrandbits(48)
+            rnd = (bits & 0xFFFFFF) * _RAND_SCALE
+            reply_rnd = (bits >> 24) * _RAND_SCALE
+
+            if poked_id != _get_self_qq(): # 如果戳一戳完全与自己无关
+                if rnd < cfg.follow_probability:
+                    target_nickname = await person_api.get_person_value(target_id, "person_name")
+                    st.last_poke_back_time = current_time  # 先更新冷却时间，避免等待发送期间的戳戳绕过冷却
+                    _schedule_poke(self, poked_id, f"（戳了{target_nickname}一下）")
+                    return True,"忍不住跟着戳了一下", True
+                else:
+                    return True,"不是找自己的，也不打算跟戳", True
+                
+            if self._check_insensitivity_period(current_time, cfg.insensitivity_duration):
+                return True, "钝感中，勿扰", True
 
             # 检查是否可以反戳（新增逻辑）
             can_poke_back = True
-            if _POKE_STATE['last_poke_back_time'] > 0:
-                time_since_last_poke_back = current_time - _POKE_STATE['last_poke_back_time']
+            if st.last_poke_back_time > 0:
+                time_since_last_poke_back = current_time - st.last_poke_back_time
                 if time_since_last_poke_back < POKE_BACK_COOLDOWN:
                     can_poke_back = False
-                    logger.info(f"戳一戳冷却中，还需等待 {POKE_BACK_COOLDOWN - time_since_last_poke_back:.1f} 秒")
+                    logger.debug(f"戳一戳冷却中，还需等待 {POKE_BACK_COOLDOWN - time_since_last_poke_back:.1f} 秒")
 
-            if not poked_id == self_id: # 如果戳一戳完全与自己无关
-                if random.random() < self.FOLLOW_POKE_PROBABILITY:
-                    await asyncio.sleep(3)
-                    await self.send_command("SEND_POKE",{"qq_id": poked_id},f"（戳了{target_nickname}一下）")
-                    _POKE_STATE['last_poke_back_time'] = current_time  # 更新上次戳一戳时间
-                    return True,"忍不住跟着戳了一下", True
-                else:
-                    return True,"不是找自己的，也不打算跟戳", True
-                
-            if self._check_insensitivity_period(current_time):
-                return True, "钝感中，勿扰", True
-            
-            _POKE_STATE['last_poke_received_time'] = current_time  # 更新上次接收到戳一戳的时间
+            st.last_poke_received_time = current_time  # 更新上次接收到戳一戳的时间
             
-            self.start_decay_task_if_needed()
-            counter_lock = _get_or_create_lock()
-            if counter_lock:
-                async with counter_lock:
-                    _POKE_STATE['last_poke_time'] = current_time
-                    _POKE_STATE['poke_count'] += 1
-            else:
-            # 如果无法获取锁，直接更新（降级处理）
-                _POKE_STATE['last_poke_time'] = current_time
-                _POKE_STATE['poke_count'] += 1
+            # 计数更新之间没有await，事件循环内不会被打断，无需加锁
+            st.poke_count += 1
+            # 从这次被戳开始重新计时，满一个衰减间隔没有新的戳戳时计数器减1
+            loop = asyncio.get_running_loop()
+            _schedule_decay(loop, cfg.counts_decay_interval)
 
             # === 动态后缀生成 ===
-            if _POKE_STATE['current_poke_threshold'] == 0:
+            if st.current_poke_threshold == 0:
                 self.generate_random_silence_params()
 
-            if _POKE_STATE['poke_count'] >= _POKE_STATE['current_poke_threshold']:
-                suffix = "（请一定要回答类似于“哼，我不理你了”的话语以表示对过多戳一戳的抗议）"
+            if st.poke_count >= st.current_poke_threshold:
+                suffix = _SUFFIX_PROTEST
 
             # 触发沉默机制
-                _POKE_STATE['is_silent'] = True
-                _POKE_STATE['silence_start_time'] = time.time()
-                logger.info(f"触发沉默机制，戳戳次数: {_POKE_STATE['poke_count']}/{_POKE_STATE['current_poke_threshold']}, 沉默时长: {_POKE_STATE['current_silence_duration']}秒")
+                _start_silence(loop, st.current_silence_duration)
+                logger.info(f"触发沉默机制，戳戳次数: {st.poke_count}/{st.current_poke_threshold}, 沉默时长: {st.current_silence_duration}秒")
             # 为下次沉默生成新的随机参数 
                 self.generate_random_silence_params()
             else:
-                suffix = "（这是QQ的一个功能，用于提及某人，但没那么明显）"
+                suffix = _SUFFIX_DEFAULT
+
+            # 状态更新完成后再等待昵称查询，避免并发的戳戳读到未更新的状态
+            content = self.matched_groups.get("content")
+            target_nickname = await person_api.get_person_value(target_id, "person_name")
 
-            if random.random() < self.REFLECT_POKE_PROBABILITY and not _POKE_STATE['is_silent'] and can_poke_back:
-                await asyncio.sleep(3)
-                await self.send_command("SEND_POKE",{"qq_id": target_id},f"（戳了{target_nickname}一下）")
-                _POKE_STATE['last_poke_back_time'] = current_time  # 更新上次戳一戳时间
+            if rnd < cfg.reflect_probability and not st.is_silent and can_poke_back:
+                st.last_poke_back_time = current_time  # 先更新冷却时间，避免等待发送期间的戳戳绕过冷却
+                _schedule_poke(self, target_id, f"（戳了{target_nickname}一下）")
                 return True,"反戳一下", True
             else:
-                if not can_poke_back and not _POKE_STATE['is_silent']:
-                    if random.random() < 0.33:
+                if not can_poke_back and not st.is_silent:
+                    if reply_rnd < 0.33:
                         await self.generate_reply(content, suffix, target_nickname)
                         return True,"选择言语回复", True
                     else:
@@ -348,125 +574,65 @@ class AntiPokeCommand(BaseCommand):
             logger.error(f"{self.log_prefix} 执行错误: {e}")
             return False, f"执行失败: {str(e)}", True
         
-    def _load_config(self) -> Dict[str, Any]:
-        """从同级目录的config.toml文件直接加载配置"""
-        try:
-            # 获取当前文件所在目录
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            config_path = os.path.join(script_dir, "config.toml")
-            
-            # 读取并解析TOML配置文件
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = toml.load(f)
-            
-            # 构建配置字典，使用get方法安全访问嵌套值
-            config = {
-                "poke_value": {
-                    "min_silence_time": config_data.get("poke_value", {}).get("min_silence_time", 120),
-                    "max_silence_time": config_data.get("poke_value", {}).get("max_silence_time", 300),
-                    "min_silence_counts": config_data.get("poke_value", {}).get("min_silence_counts", 5),
-                    "max_silence_counts": config_data.get("poke_value", {}).get("max_silence_counts", 9),
-                    "counts_decay_interval": config_data.get("poke_value", {}).get("counts_decay_interval", 180),
-                    "reflect_probability": config_data.get("poke_value", {}).get("reflect_probability", 0.4),
-                    "follow_probability": config_data.get("poke_value", {}).get("follow_probability", 0.3),
-                    "insensitivity_duration": config_data.get("poke_value", {}).get("insensitivity_duration", 4),
-                }
-            }
-            return config
-        except Exception as e:
-            logger.error(f"{self.log_prefix} 加载配置失败: {e}")
-            raise
-
     def generate_random_silence_params(self):
         """
         生成随机的沉默参数
         """
         
+        cfg = _get_config()
+
         # 随机生成沉默持续时间
-        _POKE_STATE['current_silence_duration'] = random.randint(
-            self.SILENCE_DURATION_MIN, 
-            self.SILENCE_DURATION_MAX
+        _POKE_STATE.current_silence_duration = _RNG.randint(
+            cfg.min_silence_time,
+            cfg.max_silence_time
         )
         
         # 随机生成触发沉默所需的戳戳次数
-        _POKE_STATE['current_poke_threshold'] = random.randint(
-            self.POKE_COUNT_MIN, 
-            self.POKE_COUNT_MAX
+        _POKE_STATE.current_poke_threshold = _RNG.randint(
+            cfg.min_silence_counts,
+            cfg.max_silence_counts
         )
         
-        logger.info(f"生成新的沉默参数 - 持续时间: {_POKE_STATE['current_silence_duration']}秒, 触发阈值: {_POKE_STATE['current_poke_threshold']}次")
-
-    async def poke_count_decay_task(self):
-        """
-        戳一戳计数器衰减任务：每3分钟检查一次，如果没有新的戳戳则减1
-        """
-        try:
-            while True:
-                await asyncio.sleep(self.DECAY_INTERVAL)  
-            
-                if not _POKE_STATE['is_silent'] and _POKE_STATE['poke_count'] > 0:
-                    current_time = time.time()
-                    # 如果距离上次被戳超过3分钟，则计数器减1
-                    if current_time - _POKE_STATE['last_poke_time'] >= self.DECAY_INTERVAL:
-                        counter_lock = _get_or_create_lock()
-                        if counter_lock:
-                            async with counter_lock:
-                                _POKE_STATE['poke_count'] = max(0, _POKE_STATE['poke_count'] - 1)
-                                logger.info(f"戳一戳计数器衰减，当前计数: {_POKE_STATE['poke_count']}")
-                        else:
-                             # 如果无法获取锁，直接更新（降级处理）
-                            _POKE_STATE['poke_count'] = max(0, _POKE_STATE['poke_count'] - 1)
-                            logger.info(f"戳一戳计数器衰减（无锁），当前计数: {_POKE_STATE['poke_count']}")
-        except asyncio.CancelledError:
-            logger.info("戳一戳计数器衰减任务被取消")
-            raise
-        except Exception as e:
-            logger.error(f"戳一戳计数器衰减任务异常: {e}")
-            # 任务异常退出，重置任务引用
-            _POKE_STATE['decay_task'] = None
-            raise
-
-    def start_decay_task_if_needed(self):
-        """
-        在有事件循环时启动衰减任务（只启动一次）
-        """
-        if _POKE_STATE['decay_task'] is None or _POKE_STATE['decay_task'].done():
-            try:
-                _POKE_STATE['decay_task'] = asyncio.create_task(self.poke_count_decay_task())
-                logger.debug("戳一戳计数器衰减任务已启动")
-            except RuntimeError:
-                # 如果还没有事件循环，稍后再试
-                logger.debug("事件循环未就绪，稍后启动衰减任务")
-
+        logger.info(f"生成新的沉默参数 - 持续时间: {_POKE_STATE.current_silence_duration}秒, 触发阈值: {_POKE_STATE.current_poke_threshold}次")
 
     async def generate_reply(self, content: str, suffix: str, target_nickname):
+        stream_id = self.message.chat_stream.stream_id
+        if _reply_queue_full(stream_id):
+            # 队列已满时生成的回复也无法发送，直接跳过生成
+            logger.warning("该聊天待发送的回复过多，跳过本次回复")
+            return
+
         result_status, result_message = await generator_api.generate_reply(
             action_data={ 
                 "reply_to": f"{target_nickname}：{content}{suffix}(有人戳了戳你，可能是在找你，也可能是在搞怪，你需要对此做出简洁的回应)",
             },
             chat_stream=self.message.chat_stream
         )
-        if result_status:
-            # 直接从 LLMGenerationDataModel 对象获取内容
-            if hasattr(result_message, 'content') and result_message.content:
-                await self.send_type(message_type="text", content=result_message.content, typing=True)
-                await asyncio.sleep(1.0)
-            else:
-                logger.warning("生成的回复内容为空")
-
-    def _check_insensitivity_period(self, current_time: float) -> bool:
+        if not result_status:
+            logger.warning("回复生成失败，本次不回复")
+            return
+
+        # 直接从 LLMGenerationDataModel 对象获取内容
+        reply_content = getattr(result_message, 'content', None)
+        if not reply_content:
+            logger.warning("生成的回复内容为空")
+            return
+        _enqueue_reply(stream_id, self, reply_content)
+
+    def _check_insensitivity_period(self, current_time: float, insensitivity_duration: float) -> bool:
         """
         检查是否在钝感期内（无敌帧）
         
         Args:
-            current_time: 当前时间戳
+            current_time: 当前时间（time.monotonic()）
+            insensitivity_duration: 钝感时长（秒）
             
         Returns:
             bool: True表示在钝感期内，应该忽略戳一戳；False表示可以响应
         """
-        if _POKE_STATE['last_poke_received_time'] > 0:
-            time_since_last_poke = current_time - _POKE_STATE['last_poke_received_time']
-            if time_since_last_poke < self.INSENSITIVITY_DURATION:
+        if _POKE_STATE.last_poke_received_time > 0:
+            time_since_last_poke = current_time - _POKE_STATE.last_poke_received_time
+            if time_since_last_poke < insensitivity_duration:
                 return True
 
         return False